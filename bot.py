@@ -2,12 +2,20 @@ import os
 import re
 import json
 import math
+import functools
 from datetime import datetime, timezone, timedelta
 from flask import Flask, request, jsonify
 import requests
+import orjson
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import logging
+import queue
+import threading
 from dataclasses import dataclass
-import hashlib
+from typing import Optional, Tuple
+from collections import OrderedDict, defaultdict, deque
+import time
 
 app = Flask(__name__)
 
@@ -15,13 +23,186 @@ app = Flask(__name__)
 TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN', '').strip()
 TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID', '').strip()
 ALERT_MODE = os.getenv('ALERT_MODE', 'enhanced').strip()  # basic, enhanced, full
+TELEGRAM_POOL_SIZE = int(os.getenv('TELEGRAM_POOL_SIZE', '8'))  # keep-alive connections per worker
 # =================================
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
+LOG_SEPARATOR = "=" * 70
 
-@dataclass
+# Telegram API - one pooled session so sends reuse a warm keep-alive connection.
+# Transient failures (connection errors, 5xx) are retried with backoff inside
+# urllib3; anything else is returned to the caller on the first attempt.
+TELEGRAM_API_URL = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/"
+TELEGRAM_SEND_URL = TELEGRAM_API_URL + "sendMessage"
+# read=0: a POST that timed out after being sent may already have been
+# delivered, so only connection errors and 5xx responses are retried.
+# 429s are left to send_telegram_message so TELEGRAM_MAX_RETRY_AFTER applies
+telegram_retry = Retry(total=3, read=0, backoff_factor=0.3, status_forcelist=(500, 502, 503, 504),
+                       allowed_methods=frozenset(['GET', 'POST']), raise_on_status=False,
+                       respect_retry_after_header=False)
+telegram_session = requests.Session()
+telegram_session.mount('https://', HTTPAdapter(max_retries=telegram_retry, pool_connections=1,
+                                               pool_maxsize=TELEGRAM_POOL_SIZE))
+telegram_session.headers['Content-Type'] = 'application/json'
+
+# Fixed sendMessage fields; each send copies these and adds its own text
+TELEGRAM_SIGNAL_PAYLOAD = {
+    "chat_id": TELEGRAM_CHAT_ID,
+    "parse_mode": "Markdown",
+    "disable_web_page_preview": True,
+    "disable_notification": False
+}
+TELEGRAM_NOTICE_PAYLOAD = {
+    "chat_id": TELEGRAM_CHAT_ID,
+    "parse_mode": "Markdown"
+}
+
+# Set once Telegram rejects the bot token; sends then short-circuit without network I/O
+telegram_disabled = False
+
+# Flood control (429): Telegram reports the wait in the response body as retry_after.
+# Only the background notice worker waits; webhook sends return a 429 at once so a
+# request thread is never held up.
+TELEGRAM_MAX_ATTEMPTS = 3
+TELEGRAM_MAX_RETRY_AFTER = 10  # seconds; total 429 wait allowed per background send
+
+def _telegram_retry_after(response: requests.Response, default: float) -> float:
+    """Read retry_after from a 429 body, or return default if it is missing or malformed"""
+    try:
+        body = response.json()
+    except ValueError:
+        return default
+    parameters = body.get('parameters') if isinstance(body, dict) else None
+    if not isinstance(parameters, dict):
+        return default
+    try:
+        return float(parameters.get('retry_after', default))
+    except (TypeError, ValueError):
+        return default
+
+def send_telegram_message(payload: dict, timeout: float = 10,
+                          max_retry_wait: float = 0) -> Optional[requests.Response]:
+    """Send a sendMessage payload, or return None if sending has been disabled.
+    
+    On 429, waits and retries as long as the total wait stays within max_retry_wait.
+    """
+    global telegram_disabled
+    if telegram_disabled:
+        return None
+    
+    # orjson emits UTF-8 bytes directly, sent as-is with the session's JSON content type
+    body = orjson.dumps(payload)
+    waited = 0.0
+    for attempt in range(1, TELEGRAM_MAX_ATTEMPTS + 1):
+        response = telegram_session.post(TELEGRAM_SEND_URL, data=body, timeout=timeout)
+        if response.status_code != 429 or attempt == TELEGRAM_MAX_ATTEMPTS:
+            break
+        
+        wait = _telegram_retry_after(response, attempt) + 0.1
+        if not 0 < wait <= max_retry_wait - waited:
+            break
+        logger.warning("Telegram rate limit hit, retrying in %.1fs (attempt %d/%d)",
+                       wait, attempt, TELEGRAM_MAX_ATTEMPTS)
+        time.sleep(wait)
+        waited += wait
+    
+    if response.status_code == 401:
+        logger.error("❌ Telegram rejected the bot token (401); disabling sends until restart")
+        telegram_disabled = True
+    return response
+
+class RateLimiter:
+    """Sliding-window limiter: at most `rate` calls per `per` seconds"""
+    
+    def __init__(self, rate: int, per: float):
+        self.rate = rate
+        self.per = per
+        self._calls: deque = deque()
+        self._lock = threading.Lock()
+    
+    def acquire(self) -> None:
+        """Block only while the current window is saturated"""
+        with self._lock:
+            while True:
+                now = time.monotonic()
+                while self._calls and now - self._calls[0] >= self.per:
+                    self._calls.popleft()
+                if len(self._calls) < self.rate:
+                    self._calls.append(now)
+                    return
+                time.sleep(self.per - (now - self._calls[0]))
+
+# Fire-and-forget notices (e.g. rejection alerts) are delivered by a
+# background worker so they never hold up the webhook response. Bursts are
+# paced to Telegram's per-chat limit (~20 messages per minute in groups).
+telegram_notice_limiter = RateLimiter(rate=20, per=60.0)
+telegram_notice_queue: "queue.Queue[dict]" = queue.Queue()
+TELEGRAM_NOTICE_SEPARATOR = "\n\n━━━\n\n"
+TELEGRAM_NOTICE_MAX_CHARS = 3800  # headroom below Telegram's 4096-char message limit
+
+def _telegram_notice_worker():
+    """Deliver queued Telegram notices in the background"""
+    carry = None
+    while True:
+        payload = carry if carry is not None else telegram_notice_queue.get()
+        carry = None
+        taken = 1
+        try:
+            telegram_notice_limiter.acquire()
+            
+            # Coalesce notices that queued up meanwhile into a single message
+            texts = [payload['text']]
+            size = len(payload['text'])
+            while True:
+                try:
+                    pending = telegram_notice_queue.get_nowait()
+                except queue.Empty:
+                    break
+                size += len(TELEGRAM_NOTICE_SEPARATOR) + len(pending['text'])
+                if size > TELEGRAM_NOTICE_MAX_CHARS:
+                    carry = pending  # sent first in the next round
+                    break
+                texts.append(pending['text'])
+                taken += 1
+            
+            response = send_telegram_message({**payload, 'text': TELEGRAM_NOTICE_SEPARATOR.join(texts)}, timeout=5,
+                                             max_retry_wait=TELEGRAM_MAX_RETRY_AFTER)
+            if response is not None and response.status_code != 200:
+                logger.error("❌ Telegram notice error: %s - %s", response.status_code, response.text)
+        except Exception as e:
+            logger.error("Telegram notice error: %s", e)
+        finally:
+            for _ in range(taken):
+                telegram_notice_queue.task_done()
+
+# Started on first use rather than at import, so it runs in the process that
+# queues notices (not a preloading master) and not at all if none are sent
+_telegram_notice_thread: Optional[threading.Thread] = None
+_telegram_notice_thread_lock = threading.Lock()
+
+def queue_telegram_notice(payload: dict) -> None:
+    """Queue a notice for background delivery, starting the worker if needed"""
+    global _telegram_notice_thread
+    with _telegram_notice_thread_lock:
+        if _telegram_notice_thread is None or not _telegram_notice_thread.is_alive():
+            _telegram_notice_thread = threading.Thread(target=_telegram_notice_worker,
+                                                       name='telegram-notices', daemon=True)
+            _telegram_notice_thread.start()
+    telegram_notice_queue.put(payload)
+
+# TradingView interval aliases -> normalized timeframe
+TIMEFRAME_ALIASES = {
+    '1': '1m', '2': '2m', '3': '3m', '4': '4m', '5': '5m',
+    '10': '10m', '15': '15m', '30': '30m',
+    '60': '1H', '120': '2H', '240': '4H', '360': '6H', '480': '8H', '720': '12H',
+    'D': '1D', '1D': '1D', '1440': '1D',
+    'W': '1W', '1W': '1W', '10080': '1W',
+    'M': '1M', '1M': '1M'
+}
+
+@dataclass(frozen=True, slots=True)
 class TimeframeConfig:
     """Configuration for each timeframe"""
     multiplier: float
@@ -29,7 +210,7 @@ class TimeframeConfig:
     sl_multiplier: float
     tp_multiplier: float
     min_confidence: float
-    valid_for_hours: int
+    valid_for_hours: float
 
 class TimeframeCalculator:
     """Calculate optimal parameters based on timeframe"""
@@ -86,40 +267,60 @@ class TimeframeCalculator:
         }
     }
     
+    # Forex quote precision by pip size (one decimal beyond the pip)
+    FOREX_PRICE_DECIMALS = {0.0001: 5, 0.01: 3}
+    
+    # Take-profit ladder as fractions of the target distance (TP1, TP2, TP3)
+    TP_LEVELS = (0.5, 1.0, 1.5)
+    
+    # Optimal timeframes for each instrument type
+    OPTIMAL_TIMEFRAMES = {
+        'FOREX': ('15m', '1H', '4H', '1D'),
+        'INDICES': ('15m', '1H', '4H', '1D'),
+        'COMMODITIES': ('1H', '4H', '1D'),
+        'CRYPTO': ('5m', '15m', '1H', '4H')
+    }
+    
+    # Set view of OPTIMAL_TIMEFRAMES for O(1) membership checks
+    _OPTIMAL_TIMEFRAME_SETS = {k: frozenset(v) for k, v in OPTIMAL_TIMEFRAMES.items()}
+    
     @classmethod
+    @functools.lru_cache(maxsize=64)
     def get_timeframe_config(cls, timeframe_str: str) -> TimeframeConfig:
         """Get configuration for a specific timeframe"""
         # Normalize timeframe string
         tf = timeframe_str.upper()
         if tf.endswith('MIN'):
             tf = tf.replace('MIN', 'm')
-        elif tf.endswith('H'):
-            tf = tf.replace('H', 'H')
-        elif tf.endswith('D'):
-            tf = tf.replace('D', 'D')
-        elif tf.endswith('W'):
-            tf = tf.replace('W', 'W')
-        elif tf.endswith('M'):
-            tf = tf.replace('M', 'M')
         
         # Map common aliases
-        tf_map = {
-            '1': '1m', '2': '2m', '3': '3m', '4': '4m', '5': '5m',
-            '10': '10m', '15': '15m', '30': '30m',
-            '60': '1H', '120': '2H', '240': '4H', '360': '6H', '480': '8H', '720': '12H',
-            'D': '1D', '1D': '1D', '1440': '1D',
-            'W': '1W', '1W': '1W', '10080': '1W',
-            'M': '1M', '1M': '1M'
-        }
-        
-        tf = tf_map.get(tf, tf)
+        tf = TIMEFRAME_ALIASES.get(tf, tf)
         
         # Get config or return default for 1H
         return cls.TIMEFRAME_CONFIGS.get(tf, cls.TIMEFRAME_CONFIGS['1H'])
     
+    @classmethod
+    @functools.lru_cache(maxsize=256)
+    def get_distance_units(cls, instrument_type: str, timeframe: str) -> Tuple[float, float]:
+        """Stop and target distance for an instrument/timeframe pair, in pips (FOREX),
+        price points (INDICES) or as a fraction of the entry price (others)"""
+        tf_config = cls.get_timeframe_config(timeframe)
+        base_params = cls.BASE_PARAMS.get(instrument_type, cls.BASE_PARAMS['FOREX'])
+        
+        if instrument_type == 'FOREX':
+            return (base_params['base_sl_pips'] * tf_config.sl_multiplier,
+                    base_params['base_tp_pips'] * tf_config.tp_multiplier)
+        elif instrument_type == 'INDICES':
+            return (base_params['base_sl_points'] * tf_config.sl_multiplier * base_params['point_value'],
+                    base_params['base_tp_points'] * tf_config.tp_multiplier * base_params['point_value'])
+        else:
+            return (base_params['base_sl_percent'] * tf_config.sl_multiplier / 100,
+                    base_params['base_tp_percent'] * tf_config.tp_multiplier / 100)
+    
     def calculate_signal_parameters(self, entry_price: float, direction: str, 
                                    instrument_type: str, timeframe: str,
-                                   market_data: dict = None) -> dict:
+                                   market_data: Optional[dict] = None,
+                                   pip_value: Optional[float] = None) -> dict:
         """Calculate all signal parameters based on timeframe"""
         
         # Get timeframe configuration
@@ -128,44 +329,34 @@ class TimeframeCalculator:
         # Get base parameters for instrument
         base_params = self.BASE_PARAMS.get(instrument_type, self.BASE_PARAMS['FOREX'])
         
-        # Calculate adjusted parameters
+        # Calculate adjusted parameters from the precomputed stop/target units
+        sl_units, tp_units = self.get_distance_units(instrument_type, timeframe)
         if instrument_type == 'FOREX':
-            # Forex: Use pips with timeframe multiplier
-            sl_pips = base_params['base_sl_pips'] * tf_config.sl_multiplier
-            tp_pips = base_params['base_tp_pips'] * tf_config.tp_multiplier
-            
-            sl_distance = sl_pips * base_params['pip_value']
-            tp_distance = tp_pips * base_params['pip_value']
+            # Forex: units are pips; pip size is resolved once per signal (see detect_pip_value)
+            if pip_value is None:
+                pip_value = base_params['pip_value']
+            sl_distance = sl_units * pip_value
+            tp_distance = tp_units * pip_value
             
         elif instrument_type == 'INDICES':
-            # Indices: Use points with timeframe multiplier
-            sl_points = base_params['base_sl_points'] * tf_config.sl_multiplier
-            tp_points = base_params['base_tp_points'] * tf_config.tp_multiplier
-            
-            sl_distance = sl_points * base_params['point_value']
-            tp_distance = tp_points * base_params['point_value']
+            # Indices: units are already price points
+            sl_distance = sl_units
+            tp_distance = tp_units
             
         else:
-            # Commodities & Crypto: Use percentages with timeframe multiplier
-            sl_percent = base_params['base_sl_percent'] * tf_config.sl_multiplier
-            tp_percent = base_params['base_tp_percent'] * tf_config.tp_multiplier
-            
-            sl_distance = entry_price * (sl_percent / 100)
-            tp_distance = entry_price * (tp_percent / 100)
-        
-        # Calculate actual price levels
-        if direction in ['LONG', 'BUY']:  # Support both old and new naming
-            sl_price = entry_price - sl_distance
-            tp1_price = entry_price + (tp_distance * 0.5)
-            tp2_price = entry_price + tp_distance
-            tp3_price = entry_price + (tp_distance * 1.5)
-            rr_ratio = tp_distance / sl_distance if sl_distance > 0 else 0
-        else:  # SHORT or SELL
-            sl_price = entry_price + sl_distance
-            tp1_price = entry_price - (tp_distance * 0.5)
-            tp2_price = entry_price - tp_distance
-            tp3_price = entry_price - (tp_distance * 1.5)
-            rr_ratio = tp_distance / sl_distance if sl_distance > 0 else 0
+            # Commodities & Crypto: units are fractions of the entry price
+            sl_distance = entry_price * sl_units
+            tp_distance = entry_price * tp_units
+        
+        # Calculate actual price levels: fold direction into the distances once
+        # (+1 for LONG/BUY, -1 for SHORT/SELL) so each level is a single add
+        sign = 1.0 if direction in ('LONG', 'BUY') else -1.0  # Support both old and new naming
+        signed_sl = sign * sl_distance
+        signed_tp = sign * tp_distance
+        
+        sl_price = entry_price - signed_sl
+        tp1_price, tp2_price, tp3_price = (entry_price + signed_tp * level for level in self.TP_LEVELS)
+        rr_ratio = tp_distance / sl_distance if sl_distance > 0 else 0
         
         # Calculate position size based on risk
         risk_per_trade = 1.0 * tf_config.risk_multiplier  # Base 1% risk
@@ -178,7 +369,9 @@ class TimeframeCalculator:
         valid_until = datetime.now(timezone.utc) + timedelta(hours=tf_config.valid_for_hours)
         
         # Format numbers
-        price_decimals = base_params['price_decimals']
+        price_decimals = int(base_params['price_decimals'])
+        if instrument_type == 'FOREX' and pip_value is not None:
+            price_decimals = self.FOREX_PRICE_DECIMALS.get(pip_value, price_decimals)
         
         return {
             'stop_loss': round(sl_price, price_decimals),
@@ -212,19 +405,11 @@ class TimeframeCalculator:
         """Analyze if timeframe is suitable for the instrument"""
         tf_config = self.get_timeframe_config(timeframe)
         
-        # Define optimal timeframes for each instrument
-        optimal_tfs = {
-            'FOREX': ['15m', '1H', '4H', '1D'],
-            'INDICES': ['15m', '1H', '4H', '1D'],
-            'COMMODITIES': ['1H', '4H', '1D'],
-            'CRYPTO': ['5m', '15m', '1H', '4H']
-        }
-        
-        is_optimal = timeframe in optimal_tfs.get(instrument_type, [])
+        is_optimal = timeframe in self._OPTIMAL_TIMEFRAME_SETS.get(instrument_type, ())
         
         return {
             'is_optimal': is_optimal,
-            'recommended_timeframes': optimal_tfs.get(instrument_type, []),
+            'recommended_timeframes': list(self.OPTIMAL_TIMEFRAMES.get(instrument_type, ())),
             'volatility_factor': tf_config.multiplier,
             'suitability_score': 0.8 if is_optimal else 0.5
         }
@@ -234,18 +419,22 @@ class SignalValidator:
     
     def __init__(self):
         self.timeframe_calc = TimeframeCalculator()
-        self.signal_history = {}
+        # Kept in time order (oldest first) so expiry only touches the front
+        self.signal_history = OrderedDict()
+        # The validator is shared by all request threads; guards signal_history
+        self._lock = threading.Lock()
     
     def validate_enhanced_signal(self, signal_data: dict) -> dict:
         """Validate signal with all parameters"""
         
-        validation = {
+        validation: dict = {
             'is_valid': True,
             'confidence': 1.0,
             'warnings': [],
             'recommendations': [],
             'rejection_reasons': []
         }
+        reserved = False
         
         try:
             # Extract data
@@ -255,26 +444,37 @@ class SignalValidator:
             timeframe = signal_data.get('timeframe', '1H')
             instrument_type = signal_data.get('instrument_type', 'FOREX')
             
+            # Read the clock and timeframe config once for the whole validation
+            now = datetime.now(timezone.utc)
+            tf_config = self.timeframe_calc.get_timeframe_config(timeframe)
+            
             # Normalize action for validation
             action_normalized = self._normalize_action(action)
             
             # Check if signal is expired
             if 'entry_time' in signal_data:
                 entry_time = datetime.fromtimestamp(int(signal_data['entry_time']) / 1000, timezone.utc)
-                tf_config = self.timeframe_calc.get_timeframe_config(timeframe)
                 max_age = timedelta(hours=tf_config.valid_for_hours)
                 
-                if datetime.now(timezone.utc) - entry_time > max_age:
+                if now - entry_time > max_age:
                     validation['is_valid'] = False
                     validation['rejection_reasons'].append(f"Signal expired (older than {tf_config.valid_for_hours} hours)")
             
             # Check duplicate signal
-            signal_hash = self._create_signal_hash(signal_data)
-            if signal_hash in self.signal_history:
-                time_diff = datetime.now(timezone.utc) - self.signal_history[signal_hash]
-                if time_diff < timedelta(minutes=5):
+            signal_key = self._signal_key(signal_data)
+            with self._lock:
+                last_seen = self.signal_history.get(signal_key)
+                if last_seen is not None and now - last_seen < timedelta(minutes=5):
                     validation['is_valid'] = False
                     validation['rejection_reasons'].append("Duplicate signal (received within 5 minutes)")
+                else:
+                    # Reserve in the same step as the check so a concurrent identical
+                    # alert is seen as a duplicate; released below if this one fails
+                    self.signal_history[signal_key] = now
+                    self.signal_history.move_to_end(signal_key)
+                    # Clean old signals
+                    self._clean_old_signals(now)
+                    reserved = True
             
             # Validate price
             if price <= 0:
@@ -319,26 +519,27 @@ class SignalValidator:
                     validation['confidence'] *= 0.9
             
             # Apply timeframe-specific minimum confidence
-            tf_config = self.timeframe_calc.get_timeframe_config(timeframe)
             if validation['confidence'] < tf_config.min_confidence:
                 validation['is_valid'] = False
                 validation['rejection_reasons'].append(f"Confidence too low ({validation['confidence']:.1%} < {tf_config.min_confidence:.1%})")
             
-            # Store signal in history
-            if validation['is_valid']:
-                self.signal_history[signal_hash] = datetime.now(timezone.utc)
-                # Clean old signals
-                self._clean_old_signals()
-            
             validation['confidence'] = round(validation['confidence'], 3)
             
         except Exception as e:
-            logger.error(f"Validation error: {e}")
+            logger.error("Validation error: %s", e)
             validation['is_valid'] = False
             validation['rejection_reasons'].append(f"Validation error: {str(e)}")
         
+        if reserved and not validation['is_valid']:
+            self.release_signal(signal_data)
+        
         return validation
     
+    def release_signal(self, signal_data: dict) -> None:
+        """Drop a signal's history entry so a retry is not rejected as a duplicate"""
+        with self._lock:
+            self.signal_history.pop(self._signal_key(signal_data), None)
+    
     def _normalize_action(self, action: str) -> str:
         """Normalize action to standard format"""
         if not action:
@@ -362,18 +563,37 @@ class SignalValidator:
         
         return action_map.get(action, action)
     
-    def _create_signal_hash(self, signal_data: dict) -> str:
-        """Create unique hash for signal"""
-        hash_string = f"{signal_data.get('pair', '')}{signal_data.get('action', '')}{signal_data.get('price', '')}"
-        return hashlib.md5(hash_string.encode()).hexdigest()
-    
-    def _clean_old_signals(self):
-        """Remove old signals from history"""
-        cutoff_time = datetime.now(timezone.utc) - timedelta(hours=24)
-        self.signal_history = {
-            k: v for k, v in self.signal_history.items() 
-            if v > cutoff_time
-        }
+    def _signal_key(self, signal_data: dict) -> Tuple[str, str, object]:
+        """Create unique key for signal"""
+        # A plain tuple is hashed natively by the history dict; no digest needed
+        return (signal_data.get('pair', ''), signal_data.get('action', ''), signal_data.get('price', ''))
+    
+    def _clean_old_signals(self, now: Optional[datetime] = None) -> None:
+        """Remove old signals from history (caller must hold self._lock)"""
+        if now is None:
+            now = datetime.now(timezone.utc)
+        cutoff_time = now - timedelta(hours=24)
+        while self.signal_history:
+            if next(iter(self.signal_history.values())) > cutoff_time:
+                break
+            self.signal_history.popitem(last=False)
+
+# Shared processors, kept for the life of the worker so each webhook is
+# handled without re-creating state and duplicate detection sees history
+timeframe_calculator = TimeframeCalculator()
+signal_validator = SignalValidator()
+
+_utc_minute_cache = (-1, '')
+
+def utc_time_str() -> str:
+    """Current UTC time as 'HH:MM UTC', formatted at most once per minute"""
+    global _utc_minute_cache
+    minute = int(time.time()) // 60
+    cached_minute, cached_str = _utc_minute_cache
+    if minute != cached_minute:
+        cached_str = time.strftime('%H:%M UTC', time.gmtime(minute * 60))
+        _utc_minute_cache = (minute, cached_str)
+    return cached_str
 
 def parse_timeframe(tf_str: str) -> str:
     """Parse and normalize timeframe string"""
@@ -383,38 +603,32 @@ def parse_timeframe(tf_str: str) -> str:
     tf_str = str(tf_str).upper().strip()
     
     # Map common formats
-    tf_map = {
-        '1': '1m', '2': '2m', '3': '3m', '4': '4m', '5': '5m',
-        '10': '10m', '15': '15m', '30': '30m',
-        '60': '1H', '120': '2H', '240': '4H', '360': '6H', '480': '8H', '720': '12H',
-        'D': '1D', '1D': '1D', '1440': '1D',
-        'W': '1W', '1W': '1W', '10080': '1W',
-        'M': '1M', '1M': '1M'
-    }
-    
-    return tf_map.get(tf_str, tf_str)
+    return TIMEFRAME_ALIASES.get(tf_str, tf_str)
+
+# Symbol keywords per instrument type, checked in order. Each list is
+# compiled into one alternation so a pair is scanned once per type.
+INSTRUMENT_PATTERNS = [
+    ('INDICES', re.compile('|'.join(['GER30', 'NAS100', 'SPX500', 'US30', 'UK100', 'JPN225', 'DXY', 'NQ', 'ES', 'YM']))),
+    ('COMMODITIES', re.compile('|'.join(['XAU', 'GOLD', 'XAG', 'SILVER', 'OIL', 'BRENT', 'WTI', 'XPT', 'PLATINUM', 'CL', 'GC']))),
+    ('CRYPTO', re.compile('|'.join(['BTC', 'ETH', 'XRP', 'ADA', 'SOL', 'DOT', 'BNB', 'MATIC', 'AVAX']))),
+]
 
+@functools.lru_cache(maxsize=256)
 def detect_instrument_type(pair: str) -> str:
     """Detect instrument type from pair name"""
     pair = str(pair).upper()
     
-    # Indices
-    indices = ['GER30', 'NAS100', 'SPX500', 'US30', 'UK100', 'JPN225', 'DXY', 'NQ', 'ES', 'YM']
-    if any(index in pair for index in indices):
-        return 'INDICES'
-    
-    # Commodities
-    commodities = ['XAU', 'GOLD', 'XAG', 'SILVER', 'OIL', 'BRENT', 'WTI', 'XPT', 'PLATINUM', 'CL', 'GC']
-    if any(comm in pair for comm in commodities):
-        return 'COMMODITIES'
-    
-    # Crypto
-    cryptos = ['BTC', 'ETH', 'XRP', 'ADA', 'SOL', 'DOT', 'BNB', 'MATIC', 'AVAX']
-    if any(crypto in pair for crypto in cryptos):
-        return 'CRYPTO'
+    for instrument_type, pattern in INSTRUMENT_PATTERNS:
+        if pattern.search(pair):
+            return instrument_type
     
     return 'FOREX'  # Default
 
+@functools.lru_cache(maxsize=256)
+def detect_pip_value(pair: str) -> float:
+    """Detect forex pip size from pair name"""
+    return 0.01 if 'JPY' in str(pair).upper() else 0.0001
+
 def normalize_action_name(action: str) -> str:
     """Normalize action name to standard format"""
     if not action:
@@ -434,6 +648,46 @@ def normalize_action_name(action: str) -> str:
     else:
         return action
 
+# (emoji, title, direction display) for each normalized action
+ACTION_HEADERS = {
+    'LONG': ("🟢", "LONG ENTRY", "LONG"),
+    'SHORT': ("🔵", "SHORT ENTRY", "SHORT"),
+    'EXIT_LONG': ("🔴", "EXIT SIGNAL", "Long"),
+    'EXIT_SHORT': ("🔴", "EXIT SIGNAL", "Short")
+}
+
+# Static sections of the Telegram signal message, filled per signal with format_map
+SIGNAL_HEADER_TEMPLATE = (
+    "{emoji} *{title}* {emoji}\n\n"
+    "*Instrument:* `{pair}`\n"
+    "*Type:* `{instrument_type}`\n"
+    "*Direction:* `{direction}`\n"
+    "*Entry:* `{price}`\n"
+    "*Reason:* `{reason}`\n"
+    "*Timeframe:* `{timeframe}`\n"
+    "\n*⏰ Timeframe Analysis:*\n"
+    "• Multiplier: `{multiplier}x`\n"
+    "• Optimal: `{optimal}`\n"
+    "• Valid for: `{valid_for_hours}h`\n"
+)
+
+SIGNAL_PARAMETERS_TEMPLATE = (
+    "\n*📊 Signal Parameters:*\n"
+    "• Stop Loss: `{stop_loss}`\n"
+    "• Take Profit 1: `{take_profit_1}`\n"
+    "• Take Profit 2: `{take_profit_2}`\n"
+    "• Take Profit 3: `{take_profit_3}`\n"
+    "• Risk/Reward: `{risk_reward_ratio}`\n"
+    "• Suggested Position Size: `{position_size}`\n"
+)
+
+REJECTION_MESSAGE_TEMPLATE = (
+    "❌ *SIGNAL REJECTED*\n\n"
+    "*Pair:* `{pair}`\n"
+    "*Reason:* `{reasons}`\n"
+    "*Time:* `{time}`"
+)
+
 def format_telegram_message(signal_data: dict, validation: dict, 
                            signal_params: dict) -> str:
     """Format enhanced Telegram message - FIXED VERSION"""
@@ -447,53 +701,37 @@ def format_telegram_message(signal_data: dict, validation: dict,
     normalized_action = normalize_action_name(action)
     
     # Determine emoji and title - FIXED LOGIC
-    if 'EXIT' in normalized_action:
-        emoji = "🔴"
-        title = "EXIT SIGNAL"
-        direction_display = normalized_action.replace('EXIT_', '').title()
-    elif normalized_action == 'LONG':
-        emoji = "🟢"
-        title = "LONG ENTRY"
-        direction_display = "LONG"
-    elif normalized_action == 'SHORT':
-        emoji = "🔵"
-        title = "SHORT ENTRY"
-        direction_display = "SHORT"
-    else:
-        emoji = "⚪"
-        title = "TRADING SIGNAL"
-        direction_display = normalized_action
-    
-    message = f"{emoji} *{title}* {emoji}\n\n"
-    
-    # Basic info - FIXED: Use "Direction" instead of "Action"
-    message += f"*Instrument:* `{pair}`\n"
-    message += f"*Type:* `{signal_data.get('instrument_type', 'N/A')}`\n"
-    message += f"*Direction:* `{direction_display}`\n"
-    message += f"*Entry:* `{price}`\n"
-    message += f"*Reason:* `{signal_data.get('reason', 'N/A')}`\n"
-    message += f"*Timeframe:* `{timeframe}`\n"
+    header = ACTION_HEADERS.get(normalized_action)
+    if header is None:
+        if 'EXIT' in normalized_action:
+            header = ("🔴", "EXIT SIGNAL", normalized_action.replace('EXIT_', '').title())
+        else:
+            header = ("⚪", "TRADING SIGNAL", normalized_action)
+    emoji, title, direction_display = header
     
     # Timeframe analysis
-    tf_calc = TimeframeCalculator()
-    tf_config = tf_calc.get_timeframe_config(timeframe)
-    tf_analysis = tf_calc.analyze_timeframe_quality(timeframe, signal_data.get('instrument_type', 'FOREX'))
+    tf_config = timeframe_calculator.get_timeframe_config(timeframe)
+    tf_analysis = timeframe_calculator.analyze_timeframe_quality(timeframe, signal_data.get('instrument_type', 'FOREX'))
     
-    message += f"\n*⏰ Timeframe Analysis:*\n"
-    message += f"• Multiplier: `{tf_config.multiplier}x`\n"
-    message += f"• Optimal: `{'✅' if tf_analysis['is_optimal'] else '⚠️'}`\n"
-    message += f"• Valid for: `{tf_config.valid_for_hours}h`\n"
+    # Basic info - FIXED: Use "Direction" instead of "Action"
+    message = SIGNAL_HEADER_TEMPLATE.format_map({
+        'emoji': emoji,
+        'title': title,
+        'pair': pair,
+        'instrument_type': signal_data.get('instrument_type', 'N/A'),
+        'direction': direction_display,
+        'price': price,
+        'reason': signal_data.get('reason', 'N/A'),
+        'timeframe': timeframe,
+        'multiplier': tf_config.multiplier,
+        'optimal': '✅' if tf_analysis['is_optimal'] else '⚠️',
+        'valid_for_hours': tf_config.valid_for_hours
+    })
     
     # Signal parameters
     decimals = signal_params.get('price_decimals', 2)
     if signal_params:
-        message += f"\n*📊 Signal Parameters:*\n"
-        message += f"• Stop Loss: `{signal_params.get('stop_loss', 'N/A')}`\n"
-        message += f"• Take Profit 1: `{signal_params.get('take_profit_1', 'N/A')}`\n"
-        message += f"• Take Profit 2: `{signal_params.get('take_profit_2', 'N/A')}`\n"
-        message += f"• Take Profit 3: `{signal_params.get('take_profit_3', 'N/A')}`\n"
-        message += f"• Risk/Reward: `{signal_params.get('risk_reward_ratio', 'N/A')}`\n"
-        message += f"• Suggested Position Size: `{signal_params.get('position_size', 'N/A')}`\n"
+        message += SIGNAL_PARAMETERS_TEMPLATE.format_map(defaultdict(lambda: 'N/A', signal_params))
     
     # Strategy-specific info
     message += f"\n*🛠 Strategy Info:*\n"
@@ -529,21 +767,29 @@ def format_telegram_message(signal_data: dict, validation: dict,
         message += f"• BB Lower: `{round(signal_data.get('bb_lower', 0), decimals)}`\n"
     
     # Timestamps
-    current_time = datetime.now(timezone.utc)
     message += f"\n*🕒 Timestamps:*\n"
-    message += f"• Signal Time: `{current_time.strftime('%H:%M UTC')}`\n"
+    message += f"• Signal Time: `{utc_time_str()}`\n"
     
     if 'valid_until' in signal_params:
-        valid_time = datetime.fromisoformat(signal_params['valid_until'].replace('Z', '+00:00'))
-        message += f"• Valid Until: `{valid_time.strftime('%H:%M UTC')}`\n"
+        # valid_until is a UTC isoformat() string (YYYY-MM-DDTHH:MM:...), so HH:MM
+        # can be sliced out directly instead of parsing it back into a datetime
+        message += f"• Valid Until: `{signal_params['valid_until'][11:16]} UTC`\n"
     
     return message
 
+def load_json(data):
+    """Parse JSON with orjson, falling back to the stdlib parser for NaN,
+    Infinity and out-of-range numbers that orjson rejects"""
+    try:
+        return orjson.loads(data)
+    except orjson.JSONDecodeError:
+        return json.loads(data)
+
 @app.route('/webhook', methods=['POST', 'GET'])
 def handle_webhook():
     """Enhanced webhook handler with timeframe-aware calculations"""
     
-    logger.info("=" * 70)
+    logger.debug(LOG_SEPARATOR)
     logger.info("ENHANCED WEBHOOK RECEIVED")
     
     if request.method == 'GET':
@@ -554,14 +800,12 @@ def handle_webhook():
             "mode": ALERT_MODE
         }), 200
     
+    reserved_signal = None
     try:
         # Get raw data
         raw_data = request.get_data(as_text=True).strip()
-        logger.info(f"Received data: {raw_data[:200]}...")
-        
-        # Initialize processors
-        validator = SignalValidator()
-        timeframe_calc = TimeframeCalculator()
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Received data: %s...", raw_data[:200])
         
         # Parse based on alert mode
         signal_data = {}
@@ -569,7 +813,7 @@ def handle_webhook():
         if ALERT_MODE == "enhanced":
             try:
                 # Try to parse as JSON first
-                signal_data = json.loads(raw_data)
+                signal_data = load_json(raw_data)
                 logger.info("Parsed as JSON alert")
             except json.JSONDecodeError:
                 # Attempt to fix common JSON issues, like extra quotes or missing braces
@@ -577,10 +821,10 @@ def handle_webhook():
                 if not raw_data.endswith('}'):
                     fixed_data += '}'
                 try:
-                    signal_data = json.loads(fixed_data)
+                    signal_data = load_json(fixed_data)
                     logger.info("Parsed after fixing JSON")
                 except json.JSONDecodeError as e:
-                    logger.error(f"Failed to parse JSON even after fix: {e}")
+                    logger.error("Failed to parse JSON even after fix: %s", e)
                     return jsonify({"status": "parse_error", "message": str(e)}), 200
         else:
             # Basic mode - simple parsing
@@ -628,28 +872,34 @@ def handle_webhook():
         
         # Determine instrument type
         signal_data['instrument_type'] = detect_instrument_type(signal_data['pair'])
+        pip_value = detect_pip_value(signal_data['pair'])
         
         # FIXED: Normalize action name to ensure consistency
         signal_data['action'] = normalize_action_name(signal_data['action'])
         
-        logger.info(f"Signal: {signal_data['pair']} {signal_data['action']} @ {signal_data.get('price', 0)} TF:{signal_data['timeframe']}")
+        logger.info("Signal: %s %s @ %s TF:%s", signal_data['pair'], signal_data['action'],
+                    signal_data.get('price', 0), signal_data['timeframe'])
         
-        # Validate signal
-        validation = validator.validate_enhanced_signal(signal_data)
-        logger.info(f"Validation result: {validation}")
+        # Validate signal; a valid signal stays reserved in the duplicate history
+        # only once it has actually been sent
+        validation = signal_validator.validate_enhanced_signal(signal_data)
+        logger.debug("Validation result: %s", validation)
+        if validation['is_valid']:
+            reserved_signal = signal_data
         
         # Calculate signal parameters based on timeframe
         if validation['is_valid'] and signal_data.get('price', 0) > 0:
             try:
-                signal_params = timeframe_calc.calculate_signal_parameters(
+                signal_params = timeframe_calculator.calculate_signal_parameters(
                     entry_price=float(signal_data['price']),
                     direction=signal_data['action'],
                     instrument_type=signal_data['instrument_type'],
                     timeframe=signal_data['timeframe'],
-                    market_data=signal_data
+                    market_data=signal_data,
+                    pip_value=pip_value
                 )
             except Exception as e:
-                logger.error(f"Error calculating signal parameters: {e}")
+                logger.error("Error calculating signal parameters: %s", e)
                 signal_params = {}
         else:
             signal_params = {}
@@ -661,20 +911,16 @@ def handle_webhook():
                 message = format_telegram_message(signal_data, validation, signal_params)
                 
                 # Send to Telegram
-                url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
-                payload = {
-                    "chat_id": TELEGRAM_CHAT_ID,
-                    "text": message,
-                    "parse_mode": "Markdown",
-                    "disable_web_page_preview": True,
-                    "disable_notification": False
-                }
+                payload = {**TELEGRAM_SIGNAL_PAYLOAD, "text": message}
                 
                 logger.info("Sending signal to Telegram...")
-                response = requests.post(url, json=payload, timeout=10)
+                response = send_telegram_message(payload, timeout=10)
                 
-                if response.status_code == 200:
+                if response is None:
+                    return jsonify({"status": "telegram_disabled"}), 200
+                elif response.status_code == 200:
                     logger.info("✅ Signal sent successfully")
+                    reserved_signal = None
                     
                     # Log the successful signal
                     log_signal(signal_data, validation, signal_params)
@@ -686,26 +932,21 @@ def handle_webhook():
                         "timestamp": datetime.now(timezone.utc).isoformat()
                     }), 200
                 else:
-                    logger.error(f"❌ Telegram error: {response.status_code} - {response.text}")
+                    logger.error("❌ Telegram error: %s - %s", response.status_code, response.text)
                     return jsonify({"status": "telegram_error", "details": response.text}), 200
             else:
                 # Log rejected signal
-                logger.warning(f"Signal rejected: {validation.get('rejection_reasons', [])}")
+                logger.warning("Signal rejected: %s", validation.get('rejection_reasons', []))
                 
                 # Optionally send rejection alert (for debugging)
                 if os.getenv('SEND_REJECTIONS', 'false').lower() == 'true':
-                    reject_message = f"❌ *SIGNAL REJECTED*\n\n"
-                    reject_message += f"*Pair:* `{signal_data.get('pair', '')}`\n"
-                    reject_message += f"*Reason:* `{', '.join(validation.get('rejection_reasons', ['Unknown']))}`\n"
-                    reject_message += f"*Time:* `{datetime.now(timezone.utc).strftime('%H:%M UTC')}`"
+                    reject_message = REJECTION_MESSAGE_TEMPLATE.format_map({
+                        'pair': signal_data.get('pair', ''),
+                        'reasons': ', '.join(validation.get('rejection_reasons', ['Unknown'])),
+                        'time': utc_time_str()
+                    })
                     
-                    url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
-                    payload = {
-                        "chat_id": TELEGRAM_CHAT_ID,
-                        "text": reject_message,
-                        "parse_mode": "Markdown"
-                    }
-                    requests.post(url, json=payload, timeout=5)
+                    queue_telegram_notice({**TELEGRAM_NOTICE_PAYLOAD, "text": reject_message})
                 
                 return jsonify({
                     "status": "rejected",
@@ -717,24 +958,30 @@ def handle_webhook():
             return jsonify({"status": "no_credentials"}), 200
             
     except Exception as e:
-        logger.error(f"Webhook error: {e}", exc_info=True)
+        logger.error("Webhook error: %s", e, exc_info=True)
         return jsonify({"status": "error", "message": str(e)}), 200
     
     finally:
-        logger.info("=" * 70)
+        if reserved_signal is not None:
+            signal_validator.release_signal(reserved_signal)
+        logger.debug(LOG_SEPARATOR)
 
-def log_signal(signal_data: dict, validation: dict, parameters: dict):
+def log_signal(signal_data: dict, validation: dict, parameters: dict) -> None:
     """Log successful signal for analysis"""
-    log_entry = {
-        'timestamp': datetime.now(timezone.utc).isoformat(),
-        'signal': signal_data,
-        'validation': validation,
-        'parameters': parameters
-    }
-    
     # In production, save to database or file
-    logger.info(f"Signal logged: {signal_data.get('pair')} {signal_data.get('action')} "
-                f"(Confidence: {validation.get('confidence', 0):.1%})")
+    logger.info("Signal logged: %s %s (Confidence: %.1f%%)",
+                signal_data.get('pair'), signal_data.get('action'),
+                validation.get('confidence', 0) * 100)
+    
+    # Full record only when debugging; skip building it otherwise
+    if logger.isEnabledFor(logging.DEBUG):
+        log_entry = {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'signal': signal_data,
+            'validation': validation,
+            'parameters': parameters
+        }
+        logger.debug("Signal log entry: %s", log_entry)
 
 @app.route('/health', methods=['GET'])
 def health():
@@ -756,9 +1003,8 @@ def test_signal():
         if not data:
             return jsonify({"error": "No data provided"}), 400
         
-        # Initialize processors
+        # Fresh validator so test previews don't land in the live signal history
         validator = SignalValidator()
-        timeframe_calc = TimeframeCalculator()
         
         # Parse data
         signal_data = data.copy()
@@ -777,13 +1023,15 @@ def test_signal():
         validation = validator.validate_enhanced_signal(signal_data)
         
         # Calculate parameters
+        pip_value = detect_pip_value(signal_data.get('pair', ''))
         if signal_data.get('price', 0) > 0:
-            signal_params = timeframe_calc.calculate_signal_parameters(
+            signal_params = timeframe_calculator.calculate_signal_parameters(
                 entry_price=float(signal_data.get('price', 0)),
                 direction=signal_data.get('action', ''),
                 instrument_type=signal_data.get('instrument_type', 'FOREX'),
                 timeframe=signal_data.get('timeframe', '1H'),
-                market_data=signal_data
+                market_data=signal_data,
+                pip_value=pip_value
             )
         else:
             signal_params = {}
@@ -821,8 +1069,7 @@ def test_telegram():
             return jsonify({"error": "Telegram not configured"}), 400
         
         # Test getMe
-        url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/getMe"
-        response = requests.get(url, timeout=5)
+        response = telegram_session.get(TELEGRAM_API_URL + "getMe", timeout=5)
         
         if response.status_code != 200:
             return jsonify({
@@ -832,15 +1079,10 @@ def test_telegram():
             }), 400
         
         # Test sendMessage
-        test_message = f"✅ Telegram Test\nTime: {datetime.now(timezone.utc).strftime('%H:%M UTC')}"
-        url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
-        payload = {
-            "chat_id": TELEGRAM_CHAT_ID,
-            "text": test_message,
-            "parse_mode": "Markdown"
-        }
+        test_message = f"✅ Telegram Test\nTime: {utc_time_str()}"
+        payload = {**TELEGRAM_NOTICE_PAYLOAD, "text": test_message}
         
-        send_response = requests.post(url, json=payload, timeout=5)
+        send_response = telegram_session.post(TELEGRAM_SEND_URL, json=payload, timeout=5)
         
         return jsonify({
             "status": "success",
@@ -855,8 +1097,8 @@ def test_telegram():
 
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 5000))
-    logger.info(f"🚀 Starting Timeframe-Aware Trading Bot v7.1 on port {port}")
-    logger.info(f"🔧 Alert Mode: {ALERT_MODE}")
-    logger.info(f"🤖 Telegram configured: {bool(TELEGRAM_TOKEN and TELEGRAM_CHAT_ID)}")
+    logger.info("🚀 Starting Timeframe-Aware Trading Bot v7.1 on port %s", port)
+    logger.info("🔧 Alert Mode: %s", ALERT_MODE)
+    logger.info("🤖 Telegram configured: %s", bool(TELEGRAM_TOKEN and TELEGRAM_CHAT_ID))
     
     app.run(host='0.0.0.0', port=port, debug=False, threaded=True)
\ No newline at end of file
@@ -1,17 +1,39 @@
 import os
 import json
+import orjson
+import requests
 import telebot
-from flask import Flask, request, jsonify
+from requests.adapters import HTTPAdapter
+from telebot import apihelper
+from flask import Flask, request
 
 app = Flask(__name__)
-bot = telebot.TeleBot(os.getenv('TELEGRAM_BOT_TOKEN'))
 
+TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
+TELEGRAM_CHANNEL_ID = os.getenv('TELEGRAM_CHANNEL_ID')
+TELEGRAM_POOL_SIZE = int(os.getenv('TELEGRAM_POOL_SIZE', '8'))  # keep-alive connections per worker
+JSON_HEADERS = {'Content-Type': 'application/json'}
+
+# One pooled session shared by all TeleBot API calls, sized for concurrent webhooks
+apihelper.session = requests.Session()
+apihelper.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=TELEGRAM_POOL_SIZE))
+
+bot = telebot.TeleBot(TELEGRAM_BOT_TOKEN)
+
+# Alerts are pushed to this webhook; the bot never polls getUpdates. If command
+# handling is ever added, keep it push-based (bot.set_webhook) or use long polling
+# (bot.infinity_polling(timeout=60, long_polling_timeout=50)), never short polling.
 @app.route('/webhook', methods=['POST'])
 def webhook():
     try:
-        data = request.get_json()
+        raw_data = request.get_data()
+        try:
+            data = orjson.loads(raw_data) if raw_data else None
+        except orjson.JSONDecodeError:
+            # The stdlib parser still accepts NaN/Infinity, which orjson rejects
+            data = json.loads(raw_data)
         if not data:
-            return jsonify({'error': 'No JSON data'}), 400
+            return orjson.dumps({'error': 'No JSON data'}), 400, JSON_HEADERS
         
         # Format message
         pair = data.get('pair', 'Unknown')
@@ -22,15 +44,15 @@ def webhook():
         
         # Send to Telegram
         bot.send_message(
-            chat_id=os.getenv('TELEGRAM_CHANNEL_ID'),
+            chat_id=TELEGRAM_CHANNEL_ID,
             text=msg,
             parse_mode='Markdown'
         )
         
-        return jsonify({'status': 'sent'}), 200
+        return orjson.dumps({'status': 'sent'}), 200, JSON_HEADERS
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return orjson.dumps({'error': str(e)}), 500, JSON_HEADERS
 
 @app.route('/health', methods=['GET'])
 def health():